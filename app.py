@@ -1,16 +1,13 @@
 import streamlit as st
-import logging, asyncio, os, pandas as pd, time
-from dataclasses import dataclass, asdict
+import logging, asyncio, os, re, pandas as pd, time
+from dataclasses import dataclass, fields
 from typing import List, Optional
-from playwright.async_api import async_playwright, Page
-import nest_asyncio
-import tempfile
+from playwright.async_api import async_playwright, Browser, Page, TimeoutError as PlaywrightTimeoutError
+import lxml.html
+import io
 import subprocess
 import sys
 
-# Apply nest_asyncio for compatibility
-nest_asyncio.apply()
-
 # Install Playwright browsers if not already installed
 @st.cache_resource
 def install_playwright_browsers():
@@ -19,6 +16,25 @@ def install_playwright_browsers():
 # Install browsers when the app starts
 install_playwright_browsers()
 
+# Keep a warm Chromium (and the event loop that owns it) across Streamlit
+# reruns so each scrape skips the multi-second browser cold start
+@st.cache_resource
+def get_browser():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    playwright = loop.run_until_complete(async_playwright().start())
+    browser = loop.run_until_complete(playwright.chromium.launch(
+        headless=True,
+        args=[
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-blink-features=AutomationControlled',
+            '--disable-extensions',
+            '--disable-plugins',
+        ]
+    ))
+    return loop, browser
+
 # Data Model
 @dataclass
 class Place:
@@ -36,134 +52,159 @@ class Place:
     introduction: str = ""
     url: str = ""
 
+# Field names resolved once; dataclasses.fields is reflective and slow
+# to call per place
+_PLACE_FIELDS = tuple(f.name for f in fields(Place))
+
+_DIGITS_RE = re.compile(r'\d+')
+
+# Resource types that extract_place never reads; aborting them cuts most
+# of the per-page download (map tiles, avatars, fonts)
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+
+async def block_heavy_resources(context):
+    """Abort requests for resources the scraper never uses"""
+    async def _route(route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+    await context.route("**/*", _route)
+
 # Setup logging
 def setup_logging():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
-# Helper functions
-async def extract_text(page: Page, selector: str) -> str:
-    try:
-        element = page.locator(selector)
-        if await element.count() > 0:
-            return (await element.first.inner_text()).strip()
-    except:
-        return ""
-    return ""
-
-async def extract_attribute(page: Page, selector: str, attribute: str) -> str:
-    try:
-        element = page.locator(selector)
-        if await element.count() > 0:
-            return await element.first.get_attribute(attribute)
-    except:
-        return ""
-    return ""
+def _css_text(tree, selector: str) -> str:
+    nodes = tree.cssselect(selector)
+    return nodes[0].text_content().strip() if nodes else ""
 
-async def extract_place(page: Page) -> Place:
-    """Extract all relevant fields for a given place"""
+def _css_attr(tree, selector: str, attribute: str) -> str:
+    nodes = tree.cssselect(selector)
+    return (nodes[0].get(attribute) or "") if nodes else ""
+
+def parse_place_html(html: str, url: str) -> Place:
+    """Parse a snapshot of a place page into a Place, entirely in-process"""
+    tree = lxml.html.fromstring(html)
     p = Place()
-    
-    # Wait for page to load
-    await page.wait_for_selector('h1', timeout=10000)
-    
-    # Extract data using multiple selectors to increase success rate
-    p.name = await extract_text(page, 'h1')
-    if not p.name:
-        p.name = await extract_text(page, '//h1[contains(@class, "DUwDvf")]')
-    
-    p.address = await extract_text(page, '//button[@data-item-id="address"]//div')
-    if not p.address:
-        p.address = await extract_text(page, 'button[data-item-id="address"]')
-    
-    p.website = await extract_text(page, '//a[@data-item-id="authority"]//div')
-    if not p.website:
-        p.website = await extract_attribute(page, '//a[@data-item-id="authority"]', 'href')
-    
-    p.phone_number = await extract_text(page, '//button[contains(@data-item-id, "phone")]//div')
-    if not p.phone_number:
-        p.phone_number = await extract_text(page, 'button[data-item-id*="phone"]')
-    
-    p.place_type = await extract_text(page, '//button[contains(@class, "DkEaL")]')
-    if not p.place_type:
-        p.place_type = await extract_text(page, '//button[contains(@class, "fontBodyMedium")]')
-    
-    p.opens_at = await extract_text(page, '//button[contains(@data-item-id, "oh")]//div')
-    
+
+    p.name = _css_text(tree, 'h1') or _css_text(tree, 'h1.DUwDvf')
+    p.address = _css_text(tree, 'button[data-item-id="address"]')
+    p.website = _css_text(tree, 'a[data-item-id="authority"]') or \
+        _css_attr(tree, 'a[data-item-id="authority"]', 'href')
+    p.phone_number = _css_text(tree, 'button[data-item-id^="phone"]')
+    p.place_type = _css_text(tree, 'button.DkEaL') or _css_text(tree, 'button.fontBodyMedium')
+    p.opens_at = _css_text(tree, 'button[data-item-id^="oh"]')
+
     # Reviews
-    reviews_text = await extract_text(page, '//span[contains(@aria-label, "review")]')
+    reviews_text = _css_text(tree, 'span[aria-label*="review"]')
     if reviews_text:
-        try:
-            import re
-            numbers = re.findall(r'\d+', reviews_text)
-            if len(numbers) > 0:
-                p.reviews_count = int(numbers[-1])
-        except:
-            pass
-    
-    rating_text = await extract_text(page, '//div[@jsaction="pane.rating.more"]//span[@aria-hidden="true"]')
+        numbers = _DIGITS_RE.findall(reviews_text)
+        p.reviews_count = int(numbers[-1]) if numbers else None
+
+    rating_text = _css_text(tree, 'div[jsaction="pane.rating.more"] span[aria-hidden="true"]')
     if rating_text:
         try:
             p.reviews_average = float(rating_text.replace(',', '.'))
-        except:
+        except ValueError:
             pass
-    
-    p.url = page.url
+
+    p.url = url
     return p
 
+async def extract_place(page: Page) -> Place:
+    """Extract all relevant fields for a given place"""
+    # Wait for page to load
+    await page.wait_for_selector('h1', timeout=10000)
+
+    # One content fetch, then parse offline via libxml2 so the page's JS
+    # thread is free for the other concurrent workers
+    html = await page.content()
+    return parse_place_html(html, page.url)
+
+# Stop scrolling after this many consecutive scrolls yield no new links
+MAX_STAGNANT_SCROLLS = 2
+
 # Function to search for a single query
 async def search_single_query(page: Page, query: str, max_results: int) -> List[str]:
     """Search for a single query and return place URLs"""
     await page.goto("https://www.google.com/maps", timeout=60000)
-    await page.wait_for_timeout(2000)
-    
+    await page.wait_for_selector('input#searchboxinput', timeout=10000)
+
     # Fill search box and press Enter
     await page.fill('input#searchboxinput', query)
     await page.keyboard.press("Enter")
-    await page.wait_for_timeout(4000)
-    
+
     # Wait for results to load
     await page.wait_for_selector('a[href*="/maps/place/"]', timeout=10000)
     
-    # Scroll to load more results
-    last_count = 0
-    scroll_attempts = 0
-    max_scrolls = 10
-    
-    while scroll_attempts < max_scrolls and scroll_attempts < 5:  # Reduced attempts
-        await page.mouse.wheel(0, 3000)  # Scroll less each time
-        await page.wait_for_timeout(1500)
-        
-        current_count = await page.locator('a[href*="/maps/place/"]').count()
-        
-        if current_count >= max_results:
+    # Scroll to load more results, reading every href in one round trip
+    # per pass and stopping as soon as enough unique URLs are collected
+    collected: dict = {}  # Insertion-ordered unique URLs
+    stagnant_scrolls = 0
+
+    while True:
+        hrefs = await page.eval_on_selector_all(
+            'a[href*="/maps/place/"]', '(els) => els.map(e => e.href)'
+        )
+        before = len(collected)
+        for href in hrefs:
+            if href:
+                collected[href] = None
+
+        if len(collected) >= max_results:
             break
-        elif current_count == last_count:
-            scroll_attempts += 1
+        if len(collected) == before:
+            stagnant_scrolls += 1
+            if stagnant_scrolls >= MAX_STAGNANT_SCROLLS:
+                break
         else:
-            scroll_attempts = 0
-        
-        last_count = current_count
-        if current_count > 0:
-            st.text(f"Found {current_count} results for '{query}'...")
-    
-    # Get unique URLs
-    links = await page.locator('a[href*="/maps/place/"]').all()
-    urls = []
-    seen_urls = set()
-    
-    for link in links:
-        href = await link.get_attribute('href')
-        if href and href not in seen_urls and href not in urls:
-            seen_urls.add(href)
-            urls.append(href)
-    
-    return urls[:max_results]
+            stagnant_scrolls = 0
+            st.text(f"Found {len(collected)} results for '{query}'...")
+
+        await page.mouse.wheel(0, 3000)  # Scroll less each time
+        try:
+            # Wait until new links render rather than sleeping a fixed time
+            await page.wait_for_function(
+                '(count) => document.querySelectorAll(\'a[href*="/maps/place/"]\').length > count',
+                arg=len(hrefs),
+                timeout=3000
+            )
+        except PlaywrightTimeoutError:
+            pass  # No growth within the window; the stagnation check handles it
+
+    return list(collected)[:max_results]
+
+# Number of search terms queried concurrently
+SEARCH_CONCURRENCY = 4
+
+# Number of place pages scraped concurrently
+DETAIL_CONCURRENCY = 6
+
+# Each pool context gets its own cookie jar plus a distinct user agent
+# and viewport, so the concurrent fetches don't share one fingerprint
+POOL_USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+]
+POOL_VIEWPORTS = [
+    {'width': 1920, 'height': 1080},
+    {'width': 1600, 'height': 900},
+    {'width': 1536, 'height': 864},
+    {'width': 1440, 'height': 900},
+    {'width': 1366, 'height': 768},
+    {'width': 1680, 'height': 1050},
+]
 
 # Main scraper function with multiple queries
-async def scrape_places(search_for: str, total: int, progress_bar) -> List[Place]:
+async def scrape_places(browser: Browser, search_for: str, total: int, progress_bar) -> List[Place]:
     setup_logging()
     results: List[Place] = []
-    
+
     # Generate related search terms to get more results
     search_terms = [
         search_for,
@@ -175,76 +216,128 @@ async def scrape_places(search_for: str, total: int, progress_bar) -> List[Place
         f"{search_for} chain",
         f"{search_for} local"
     ]
-    
+
     all_urls = set()
-    
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=[
-                '--no-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-blink-features=AutomationControlled',
-                '--disable-extensions',
-                '--disable-plugins',
-            ]
-        )
-        
-        context = await browser.new_context(
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            viewport={'width': 1920, 'height': 1080}
+
+    context = await browser.new_context(
+        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+        viewport={'width': 1920, 'height': 1080}
+    )
+    await block_heavy_resources(context)
+
+    # Search the term variants concurrently on a small pool of pages
+    search_page_pool: asyncio.Queue = asyncio.Queue()
+    search_pages = [await context.new_page() for _ in range(min(SEARCH_CONCURRENCY, len(search_terms)))]
+    for sp in search_pages:
+        await search_page_pool.put(sp)
+
+    search_semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
+
+    async def search_worker(term: str):
+        async with search_semaphore:
+            if len(all_urls) >= total:  # Enough URLs collected already
+                return
+            search_page = await search_page_pool.get()
+            try:
+                st.text(f"Searching: {term}")
+                urls = await search_single_query(search_page, term, min(30, total))  # Limit per search
+                all_urls.update(urls)
+            except Exception as e:
+                logging.warning(f"Error searching '{term}': {e}")
+            finally:
+                await search_page_pool.put(search_page)
+
+    await asyncio.gather(*[search_worker(t) for t in search_terms])
+
+    for sp in search_pages:
+        await sp.close()
+
+    st.text(f"Collected {len(all_urls)} unique place URLs")
+
+    # Process unique URLs concurrently over a pool of pages
+    urls_list = list(all_urls)[:total]
+    progress_bar.progress(0)
+
+    # One page per context so each worker has its own cookie jar
+    pool_size = min(DETAIL_CONCURRENCY, max(len(urls_list), 1))
+    contexts = []
+    page_pool: asyncio.Queue = asyncio.Queue()
+    for i in range(pool_size):
+        ctx = await browser.new_context(
+            user_agent=POOL_USER_AGENTS[i % len(POOL_USER_AGENTS)],
+            viewport=POOL_VIEWPORTS[i % len(POOL_VIEWPORTS)]
         )
-        
-        page = await context.new_page()
-        
-        # Search multiple terms to get more results
-        for term in search_terms:
-            st.text(f"Searching: {term}")
-            urls = await search_single_query(page, term, min(30, total))  # Limit per search
-            all_urls.update(urls)
-            
-            if len(all_urls) >= total:
-                break
-            
-            await page.wait_for_timeout(2000)  # Wait between searches
-        
-        st.text(f"Collected {len(all_urls)} unique place URLs")
-        
-        # Process each unique URL
-        urls_list = list(all_urls)[:total]
-        progress_bar.progress(0)
-        
-        for i, url in enumerate(urls_list):
+        await block_heavy_resources(ctx)
+        contexts.append(ctx)
+        await page_pool.put(await ctx.new_page())
+
+    semaphore = asyncio.Semaphore(DETAIL_CONCURRENCY)
+    results_lock = asyncio.Lock()
+    seen_names: set = set()
+    done_count = 0
+
+    async def worker(url: str):
+        nonlocal done_count
+        async with semaphore:
+            worker_page = await page_pool.get()
             try:
-                await page.goto(url, timeout=15000)
-                await page.wait_for_timeout(1500)
-                
-                place = await extract_place(page)
-                
-                if place.name and place.name not in [p.name for p in results]:  # Avoid duplicates by name
-                    results.append(place)
-                    st.text(f"Added: {place.name}")
-                
-                progress_bar.progress((i + 1) / len(urls_list))
-                
-                await page.wait_for_timeout(1000)  # Be respectful
-                
+                await worker_page.goto(url, timeout=15000)
+
+                place = await extract_place(worker_page)
+
+                async with results_lock:
+                    if place.name and place.name not in seen_names:  # Avoid duplicates by name
+                        seen_names.add(place.name)
+                        results.append(place)
+                        st.text(f"Added: {place.name}")
+
+                await worker_page.wait_for_timeout(1000)  # Be respectful
+
             except Exception as e:
                 logging.warning(f"Error processing {url}: {e}")
-                continue
-        
-        await browser.close()
-    
+            finally:
+                async with results_lock:
+                    done_count += 1
+                    progress_bar.progress(done_count / len(urls_list))
+                await page_pool.put(worker_page)
+
+    if urls_list:
+        await asyncio.gather(*[worker(u) for u in urls_list])
+
+    for ctx in contexts:
+        await ctx.close()
+    await context.close()
+
     return results
 
-# Save results to Excel
-def save_results(places: List[Place], path="results.xlsx"):
-    df = pd.DataFrame([asdict(p) for p in places])
-    # Remove columns that have the same value for all rows
-    df = df.loc[:, df.nunique() > 1]
-    df.to_excel(path, index=False)
+# Memoize whole scrape runs so repeating a query within the TTL skips
+# the browser entirely; the progress bar is underscored out of the key
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_scrape(search_for: str, total: int, _progress_bar) -> List[Place]:
+    loop, browser = get_browser()
+    return loop.run_until_complete(
+        scrape_places(browser, search_for, total, _progress_bar)
+    )
+
+# Build the results table
+def build_results_df(places: List[Place]) -> pd.DataFrame:
+    # Build columns directly rather than per-row dicts pandas must transpose
+    cols = {n: [getattr(p, n) for p in places] for n in _PLACE_FIELDS}
+    df = pd.DataFrame(cols)
+    # Remove columns where every row still holds the first row's value
+    keep = [c for c in df.columns if not (df[c] == df[c].iloc[0]).all()]
+    df = df[keep]
     return df
 
+# Cache the serialized workbook so download re-clicks and reruns with
+# the same results skip another to_excel pass
+@st.cache_data(show_spinner=False)
+def to_xlsx_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False)
+    return buf.getvalue()
+
 # Streamlit UI
 def main():
     st.set_page_config(page_title="Google Maps Scraper", layout="wide")
@@ -266,36 +359,26 @@ def main():
         
         with st.spinner("Starting browser and searching... This may take several minutes..."):
             try:
-                # Run the async scraper
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                results = loop.run_until_complete(
-                    scrape_places(search_query, num_results, progress_bar)
-                )
+                # Run the async scraper (cached per query/size for an hour)
+                results = cached_scrape(search_query, num_results, progress_bar)
                 
                 if not results:
                     st.warning("⚠️ No results found.")
                     return
 
-                df = save_results(results)
-                
+                df = build_results_df(results)
+
                 # Display results
                 st.success(f"✅ Success! Scraped {len(df)} unique places")
                 st.dataframe(df)
-                
-                # Create download button
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-                    df.to_excel(tmp.name, index=False)
-                    tmp_path = tmp.name
-                
-                with open(tmp_path, "rb") as f:
-                    st.download_button(
-                        label="Download Excel",
-                        data=f,
-                        file_name="google_maps_results.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-                
+
+                st.download_button(
+                    label="Download Excel",
+                    data=to_xlsx_bytes(df),
+                    file_name="google_maps_results.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
             except Exception as e:
                 st.error(f"Error occurred: {e}")
                 st.error("This might be due to Google Maps anti-bot measures. Try again later or with a different search term.")